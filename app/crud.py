@@ -1,7 +1,22 @@
+import asyncio
 import base64
 import json
-from .database import get_db, DB_TYPE, retry_db_operation_async
-from typing import Dict, List
+from .database import get_db, get_db_sync, DB_TYPE, retry_db_operation_async
+from typing import Dict, List, Set
+
+# 待写入的缓存命中计数 {id: 次数}，由维护任务批量刷入数据库，避免读请求产生写操作
+_pending_hits: Dict[int, int] = {}
+# 待刷新最后访问时间的目标语言组合
+_pending_langsets: Set[str] = set()
+
+MYSQL_TOUCH_LANGSET = """
+    INSERT INTO translation_langsets (trans_lang, last_hit_time) VALUES (%s, CURRENT_TIMESTAMP)
+    ON DUPLICATE KEY UPDATE last_hit_time = CURRENT_TIMESTAMP
+"""
+SQLITE_TOUCH_LANGSET = """
+    INSERT INTO translation_langsets (trans_lang, last_hit_time) VALUES (?, CURRENT_TIMESTAMP)
+    ON CONFLICT(trans_lang) DO UPDATE SET last_hit_time = CURRENT_TIMESTAMP
+"""
 
 @retry_db_operation_async()
 async def get_cached_translations(source_texts: List[str], source_lang: str, trans_lang: List[str]) -> Dict[str, Dict]:
@@ -11,7 +26,7 @@ async def get_cached_translations(source_texts: List[str], source_lang: str, tra
 
     if DB_TYPE == "mysql":
         placeholders = ", ".join(["%s"] * len(source_texts))
-        query = f"SELECT source_text, translations_blob FROM translations_new WHERE source_text IN ({placeholders}) "
+        query = f"SELECT id, source_text, trans_lang, translations_blob FROM translations_new WHERE source_text IN ({placeholders}) "
         params = [*source_texts]
         if trans_lang:
             query += " AND trans_lang = %s"
@@ -21,7 +36,7 @@ async def get_cached_translations(source_texts: List[str], source_lang: str, tra
             rows = await cursor.fetchall()
     else:
         placeholders = ", ".join(["?"] * len(source_texts))
-        query = f"SELECT source_text, translations_blob FROM translations_new WHERE source_text IN ({placeholders}) "
+        query = f"SELECT id, source_text, trans_lang, translations_blob FROM translations_new WHERE source_text IN ({placeholders}) "
         params = [*source_texts]
         if trans_lang:
             query += " AND trans_lang = ?"
@@ -35,8 +50,64 @@ async def get_cached_translations(source_texts: List[str], source_lang: str, tra
         translations = json.loads(base64.b64decode(row["translations_blob"]).decode("utf-8"))
         source_text = row["source_text"]
         cached_translations[source_text] = translations
+        _pending_hits[row["id"]] = _pending_hits.get(row["id"], 0) + 1
+        _pending_langsets.add(row["trans_lang"])
     return cached_translations
     
+def _sqlite_flush_hits(query: str, data: List, langsets: List):
+    with get_db_sync('write') as conn:
+        conn.executemany(query, data)
+        conn.executemany(SQLITE_TOUCH_LANGSET, langsets)
+        conn.commit()
+
+async def flush_cache_hits() -> int:
+    """将内存中累积的命中计数批量写入数据库，返回更新的行数"""
+    global _pending_hits, _pending_langsets
+    if not _pending_hits:
+        return 0
+    hits, _pending_hits = _pending_hits, {}
+    langsets, _pending_langsets = _pending_langsets, set()
+    data = [(count, row_id) for row_id, count in hits.items()]
+    langset_data = [(trans_lang,) for trans_lang in langsets]
+
+    written = False
+    try:
+        if DB_TYPE == "mysql":
+            # update_time 带 ON UPDATE，需显式保持原值
+            query = """
+                UPDATE translations_new
+                SET hit_count = hit_count + %s, last_hit_time = CURRENT_TIMESTAMP, update_time = update_time
+                WHERE id = %s
+            """
+            async with get_db('write') as (conn, cursor):
+                await cursor.executemany(query, data)
+                await cursor.executemany(MYSQL_TOUCH_LANGSET, langset_data)
+                await conn.commit()
+        else:
+            query = """
+                UPDATE translations_new
+                SET hit_count = hit_count + ?, last_hit_time = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """
+            # 维护任务可能正持有写锁，放到线程里等待，不阻塞事件循环；
+            # 任务被取消时线程里的写入仍会执行完，等它结束再决定是否合并回去
+            write = asyncio.ensure_future(asyncio.to_thread(_sqlite_flush_hits, query, data, langset_data))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                await write
+                written = True
+                raise
+        written = True
+    except BaseException:
+        # 写入失败或任务被取消时合并回去，下次（或关闭时）再刷
+        if not written:
+            for row_id, count in hits.items():
+                _pending_hits[row_id] = _pending_hits.get(row_id, 0) + count
+            _pending_langsets.update(langsets)
+        raise
+    return len(data)
+
 async def save_translations_batch(items: List[Dict], translations: List[Dict], trans_lang: List[str]):
     """批量保存翻译结果（自动Base64编码），兼容MySQL和SQLite"""
     if not items:
@@ -58,21 +129,28 @@ async def save_translations_batch(items: List[Dict], translations: List[Dict], t
     if DB_TYPE == "mysql":
         query = """
             INSERT INTO translations_new 
-            (source_text, source_lang, trans_lang, translations_blob) 
-            VALUES (%s, %s, %s, %s)
+            (source_text, source_lang, trans_lang, translations_blob, last_hit_time) 
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
             ON DUPLICATE KEY UPDATE 
                 translations_blob = VALUES(translations_blob),
-                update_time = CURRENT_TIMESTAMP
+                update_time = CURRENT_TIMESTAMP,
+                last_hit_time = CURRENT_TIMESTAMP
         """
         async with get_db('write') as (conn, cursor):
             await cursor.executemany(query, data)
+            await cursor.execute(MYSQL_TOUCH_LANGSET, (trans_lang_json,))
             await conn.commit()
     else:
         query = """
-            INSERT OR REPLACE INTO translations_new 
-            (source_text, source_lang, trans_lang, translations_blob) 
-            VALUES (?, ?, ?, ?)
+            INSERT INTO translations_new 
+            (source_text, source_lang, trans_lang, translations_blob, last_hit_time) 
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source_text, source_lang, trans_lang) DO UPDATE SET
+                translations_blob = excluded.translations_blob,
+                update_time = CURRENT_TIMESTAMP,
+                last_hit_time = CURRENT_TIMESTAMP
         """
         async with get_db('write') as (conn, cursor):
             cursor.executemany(query, data)
+            cursor.execute(SQLITE_TOUCH_LANGSET, (trans_lang_json,))
             conn.commit()
\ No newline at end of file
@@ -7,12 +7,23 @@ import aiomysql
 from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
 from typing import Dict, List
-from time import sleep
+from time import sleep, monotonic
 from functools import wraps
 from asyncio import Lock
 
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，SQLite 跨进程锁退化为不加锁
+    fcntl = None
+
 DB_PATH = Path(os.getenv("DB_PATH", "translations.db"))
 DB_TYPE = os.getenv("DB_TYPE", "sqlite")
+# SQLite 内存映射大小，多个连接共享系统页缓存，让热点数据常驻内存
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+# 已有 SQLite 库切换增量 vacuum 需要一次阻塞的完整 VACUUM，默认不在启动时执行
+SQLITE_VACUUM_ON_STARTUP = os.getenv("SQLITE_VACUUM_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+# 多个 worker 同时启动时等待其他 worker 完成建表/迁移的最长时间(秒)
+DB_MIGRATE_LOCK_TIMEOUT = int(os.getenv("DB_MIGRATE_LOCK_TIMEOUT", 3600))
 DB_WRITE_CONFIG = {
     'host': os.getenv("DB_WRITE_HOST", "localhost"),
     'port': int(os.getenv("DB_WRITE_PORT", 3306)),
@@ -57,6 +68,7 @@ def get_db_sync(operation='read'):
     else:
         conn = sqlite3.connect(DB_PATH)
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
     try:
         yield conn
     except Exception as e:
@@ -109,10 +121,77 @@ async def get_db(operation='read'):
         with get_sqlite_conn(operation) as (conn, cursor):
             yield conn, cursor
 
+@asynccontextmanager
+async def db_lock(name: str, timeout: float = 0):
+    """多个 worker 进程之间的互斥锁，yield 是否拿到锁
+
+    MySQL 使用 GET_LOCK，SQLite 使用数据库文件旁的文件锁；timeout 为等待秒数，0 表示拿不到立即返回
+    """
+    if DB_TYPE == "mysql":
+        lock_name = f"{DB_WRITE_CONFIG['db']}.{name}"
+        await init_mysql_pools()
+        async with mysql_write_pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, %s)", (lock_name, timeout))
+                (acquired,) = await cursor.fetchone()
+                try:
+                    yield acquired == 1
+                finally:
+                    if acquired == 1:
+                        await cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+                        await cursor.fetchone()
+    elif fcntl is None:
+        yield True
+    else:
+        with open(DB_PATH.with_name(f"{DB_PATH.name}.{name}.lock"), "a") as lock_file:
+            deadline = monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if monotonic() >= deadline:
+                        acquired = False
+                        break
+                    await asyncio.sleep(0.5)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# 命中统计字段（缓存维护使用），init_db 时自动补齐
+MYSQL_HIT_COLUMNS = {
+    "hit_count": "BIGINT NOT NULL DEFAULT 0",
+    "last_hit_time": "TIMESTAMP NULL",
+}
+SQLITE_HIT_COLUMNS = {
+    "hit_count": "INTEGER NOT NULL DEFAULT 0",
+    "last_hit_time": "DATETIME",
+}
+
+# 过期清理按 last_hit_time 范围查询，语言组合清理按 trans_lang 查询
+MYSQL_MAINTENANCE_INDEXES = {
+    "idx_last_hit_time": "(last_hit_time)",
+    "idx_trans_lang_last_hit": "(trans_lang(100), last_hit_time)",
+}
+SQLITE_MAINTENANCE_INDEXES = {
+    "idx_last_hit_time": "(last_hit_time)",
+    "idx_trans_lang_last_hit": "(trans_lang, last_hit_time)",
+}
+
 async def init_db():
     """
     初始化数据库（使用Base64存储）
     """
+    # 多个 worker 同时启动，迁移（加字段/索引、回填、VACUUM）需要串行执行
+    async with db_lock("migrate", DB_MIGRATE_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            raise RuntimeError(f"等待数据库迁移锁超时({DB_MIGRATE_LOCK_TIMEOUT}s)")
+        await _migrate_db()
+
+async def _migrate_db():
     if DB_TYPE == "mysql":
         await init_mysql_pools()
         async with mysql_write_pool.acquire() as conn:
@@ -130,9 +209,87 @@ async def init_db():
                         UNIQUE KEY uk_source_text_lang (source_text, source_lang, trans_lang(100))
                     );
                 """)
+                # 旧表补充命中统计字段
+                for column, definition in MYSQL_HIT_COLUMNS.items():
+                    await cursor.execute("""
+                        SELECT COUNT(*) FROM information_schema.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'translations_new' AND COLUMN_NAME = %s
+                    """, (column,))
+                    (exists,) = await cursor.fetchone()
+                    if not exists:
+                        await cursor.execute(f"ALTER TABLE translations_new ADD COLUMN {column} {definition}")
+                # 旧数据没有命中记录，从现在开始计时，避免升级后首轮维护把旧缓存当作过期删除；
+                # 首次迁移后 idx_last_hit_time 已建好，后续启动这里只走索引
+                await cursor.execute("""
+                    UPDATE translations_new SET last_hit_time = CURRENT_TIMESTAMP, update_time = update_time
+                    WHERE last_hit_time IS NULL
+                """)
+                for index, definition in MYSQL_MAINTENANCE_INDEXES.items():
+                    await cursor.execute("""
+                        SELECT COUNT(*) FROM information_schema.STATISTICS
+                        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'translations_new' AND INDEX_NAME = %s
+                    """, (index,))
+                    (exists,) = await cursor.fetchone()
+                    if not exists:
+                        await cursor.execute(f"ALTER TABLE translations_new ADD INDEX {index} {definition}")
+                # 每个目标语言组合的最后访问时间，清理闲置语言组合时不用扫描 translations_new
+                await cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'translation_langsets'
+                """)
+                (langsets_exists,) = await cursor.fetchone()
+                await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS translation_langsets (
+                        trans_lang VARCHAR(255) NOT NULL PRIMARY KEY,
+                        last_hit_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        INDEX idx_last_hit_time (last_hit_time)
+                    );
+                """)
+                if not langsets_exists:
+                    await cursor.execute("""
+                        INSERT INTO translation_langsets (trans_lang, last_hit_time)
+                        SELECT trans_lang, MAX(last_hit_time) FROM translations_new GROUP BY trans_lang
+                    """)
+                await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS translations_archive (
+                        id BIGINT PRIMARY KEY,
+                        source_text VARCHAR(255) NOT NULL,
+                        source_lang VARCHAR(10) NOT NULL,
+                        trans_lang TEXT NOT NULL,
+                        translations_blob TEXT NOT NULL,
+                        create_time TIMESTAMP NULL,
+                        update_time TIMESTAMP NULL,
+                        hit_count BIGINT NOT NULL DEFAULT 0,
+                        last_hit_time TIMESTAMP NULL,
+                        archive_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                # 每轮缓存维护的表/索引大小记录
+                await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS cache_size_stats (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        expired BIGINT NOT NULL DEFAULT 0,
+                        langset_pruned BIGINT NOT NULL DEFAULT 0,
+                        optimized TINYINT NOT NULL DEFAULT 0,
+                        stats_json TEXT NOT NULL,
+                        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
                 await conn.commit()
     else:
         with get_db_sync('write') as conn:
+            # 开启增量 vacuum，维护任务可以在线分批回收空闲页
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                # 新库建表前设置即可生效，旧库需要一次完整 VACUUM
+                if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+                    if SQLITE_VACUUM_ON_STARTUP:
+                        print(f"SQLite 切换为增量 vacuum，正在执行完整 VACUUM: {DB_PATH}")
+                        conn.execute("VACUUM")
+                        print("VACUUM 完成")
+                    else:
+                        print("SQLite 未开启增量 vacuum，缓存维护无法回收空闲页；"
+                              "设置 SQLITE_VACUUM_ON_STARTUP=true 在启动时执行一次 VACUUM")
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS translations_new (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -146,4 +303,54 @@ async def init_db():
             """)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_source_text ON translations_new(source_text)")
             conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uk_source_text_lang ON translations_new(source_text, source_lang, trans_lang)")
+            # 旧表补充命中统计字段
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(translations_new)")}
+            for column, definition in SQLITE_HIT_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE translations_new ADD COLUMN {column} {definition}")
+            # 旧数据没有命中记录，从现在开始计时，避免升级后首轮维护把旧缓存当作过期删除
+            conn.execute("UPDATE translations_new SET last_hit_time = CURRENT_TIMESTAMP WHERE last_hit_time IS NULL")
+            for index, definition in SQLITE_MAINTENANCE_INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON translations_new{definition}")
+            # 每个目标语言组合的最后访问时间，清理闲置语言组合时不用扫描 translations_new
+            langsets_exists = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'translation_langsets'"
+            ).fetchone()[0]
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translation_langsets (
+                    trans_lang TEXT NOT NULL PRIMARY KEY,
+                    last_hit_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_langsets_last_hit_time ON translation_langsets(last_hit_time)")
+            if not langsets_exists:
+                conn.execute("""
+                    INSERT INTO translation_langsets (trans_lang, last_hit_time)
+                    SELECT trans_lang, MAX(last_hit_time) FROM translations_new GROUP BY trans_lang
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations_archive (
+                    id INTEGER PRIMARY KEY,
+                    source_text TEXT NOT NULL,
+                    source_lang TEXT NOT NULL,
+                    trans_lang TEXT NOT NULL,
+                    translations_blob TEXT NOT NULL,
+                    create_time DATETIME,
+                    update_time DATETIME,
+                    hit_count INTEGER NOT NULL DEFAULT 0,
+                    last_hit_time DATETIME,
+                    archive_time DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # 每轮缓存维护的表/索引大小记录
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_size_stats (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    expired INTEGER NOT NULL DEFAULT 0,
+                    langset_pruned INTEGER NOT NULL DEFAULT 0,
+                    optimized INTEGER NOT NULL DEFAULT 0,
+                    stats_json TEXT NOT NULL,
+                    create_time DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
             conn.commit()
@@ -4,17 +4,29 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .models import TranslationRequest, TranslationResponse, TranslationResult
 from .translator import AITranslator
-from .crud import get_cached_translations, save_translations_batch
+from .crud import get_cached_translations, save_translations_batch, flush_cache_hits
 import os
 import re
 from .database import init_db, mysql_write_pool, mysql_read_pool
+from .maintenance import maintenance_loop, get_size_history
 import asyncio
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    # 后台缓存维护：命中计数刷盘、过期清理、压缩
+    maintenance_task = asyncio.create_task(maintenance_loop())
     yield
+    maintenance_task.cancel()
+    try:
+        await maintenance_task
+    except asyncio.CancelledError:
+        pass
+    try:
+        await flush_cache_hits()
+    except Exception as e:
+        print("刷新命中计数失败:", e)
     # 应用关闭时释放 aiomysql 连接池
     if mysql_write_pool is not None:
         mysql_write_pool.close()
@@ -105,6 +117,11 @@ def remove_all_symbols(text):
 async def health_check():
     return "success"
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """缓存表和索引大小的历史记录"""
+    return {"code": 200, "message": "success", "data": await get_size_history()}
+
 @app.post("/translate", response_model=TranslationResponse)
 async def translate_with_cache(request: TranslationRequest):
     trans_list = request.trans or ["zh","zh-TW","tr","th","ja","ko","en","my","de","sv"]
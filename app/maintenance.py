@@ -0,0 +1,318 @@
+import asyncio
+import json
+import os
+from typing import Dict, List
+
+from .crud import flush_cache_hits
+from .database import get_db, get_db_sync, db_lock, DB_TYPE
+
+# 维护任务配置
+CACHE_HIT_FLUSH_INTERVAL = int(os.getenv("CACHE_HIT_FLUSH_INTERVAL", 30))      # 命中计数刷盘间隔(秒)
+CACHE_MAINTENANCE_INTERVAL = int(os.getenv("CACHE_MAINTENANCE_INTERVAL", 3600))  # 过期清理/压缩间隔(秒)，所有 worker 中只有一个执行
+CACHE_TTL_DAYS = int(os.getenv("CACHE_TTL_DAYS", 90))                  # 超过该天数未命中的翻译过期，0 表示不过期
+CACHE_LANGSET_IDLE_DAYS = int(os.getenv("CACHE_LANGSET_IDLE_DAYS", 30))  # 整个目标语言组合超过该天数无人请求则清理，0 表示不清理
+CACHE_ARCHIVE = os.getenv("CACHE_ARCHIVE", "false").lower() in ("1", "true", "yes")  # 过期行归档到 translations_archive 而不是直接删除
+CACHE_EXPIRE_BATCH_SIZE = int(os.getenv("CACHE_EXPIRE_BATCH_SIZE", 500))
+CACHE_VACUUM_PAGES = int(os.getenv("CACHE_VACUUM_PAGES", 1000))          # SQLite 每轮增量回收的页数
+CACHE_OPTIMIZE_MIN_ROWS = int(os.getenv("CACHE_OPTIMIZE_MIN_ROWS", 10000))  # MySQL 累计清理多少行后执行 OPTIMIZE TABLE
+CACHE_STATS_HISTORY = int(os.getenv("CACHE_STATS_HISTORY", 168))          # cache_size_stats 保留的记录数
+
+
+def _placeholder():
+    return "%s" if DB_TYPE == "mysql" else "?"
+
+
+# 最后访问时间：保存和命中时都会更新 last_hit_time（init_db 会补齐旧数据），可以直接走索引
+LAST_ACCESS_SQL = "last_hit_time"
+
+
+def _seconds_ago_sql():
+    """N 秒前的时间点，N 为参数"""
+    if DB_TYPE == "mysql":
+        return "NOW() - INTERVAL %s SECOND"
+    return "datetime('now', '-' || ? || ' seconds')"
+
+
+def _days_ago_sql():
+    """N 天前的时间点，N 为参数"""
+    if DB_TYPE == "mysql":
+        return "NOW() - INTERVAL %s DAY"
+    return "datetime('now', '-' || ? || ' days')"
+
+
+# SQLite 是同步驱动，维护任务的 SQLite 操作都放到线程里执行，不阻塞事件循环
+def _sqlite_fetch(query: str, params) -> List:
+    with get_db_sync('read') as conn:
+        return conn.execute(query, params).fetchall()
+
+
+async def _fetch(query: str, params) -> List:
+    if DB_TYPE == "mysql":
+        async with get_db('write') as (conn, cursor):
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+    return await asyncio.to_thread(_sqlite_fetch, query, params)
+
+
+def _sqlite_execute(query: str, params: List):
+    with get_db_sync('write') as conn:
+        conn.execute(query, params)
+        conn.commit()
+
+
+def _sqlite_expire(archive_query: str, delete_query: str, params: List) -> int:
+    with get_db_sync('write') as conn:
+        if CACHE_ARCHIVE:
+            conn.execute(archive_query, params)
+        removed = conn.execute(delete_query, params).rowcount
+        conn.commit()
+        return removed
+
+
+async def _expire_ids(ids: List[int], condition: str, params: List):
+    """删除（或归档后删除）指定 id 中仍满足过期条件的缓存行，返回删除行数"""
+    placeholders = ", ".join([_placeholder()] * len(ids))
+    where = f"id IN ({placeholders}) AND {condition}"
+    archive_query = f"""
+        INSERT INTO translations_archive
+        (id, source_text, source_lang, trans_lang, translations_blob, create_time, update_time, hit_count, last_hit_time)
+        SELECT id, source_text, source_lang, trans_lang, translations_blob, create_time, update_time, hit_count, last_hit_time
+        FROM translations_new WHERE {where}
+    """
+    delete_query = f"DELETE FROM translations_new WHERE {where}"
+    params = [*ids, *params]
+    if DB_TYPE == "mysql":
+        archive_query = archive_query.replace("INSERT INTO", "REPLACE INTO", 1)
+        async with get_db('write') as (conn, cursor):
+            if CACHE_ARCHIVE:
+                await cursor.execute(archive_query, params)
+            await cursor.execute(delete_query, params)
+            removed = cursor.rowcount
+            await conn.commit()
+    else:
+        archive_query = archive_query.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+        removed = await asyncio.to_thread(_sqlite_expire, archive_query, delete_query, params)
+    return removed
+
+
+async def _expire_where(condition: str, params: List, row_condition: str, row_params: List) -> int:
+    """按条件分批过期，避免长事务锁表
+
+    condition 用于每批挑选待过期的 id；row_condition 在删除时逐行复查，
+    挑选之后刚被保存或命中的行不会被删掉
+    """
+    removed = 0
+    query = f"SELECT id FROM translations_new WHERE {condition} LIMIT {CACHE_EXPIRE_BATCH_SIZE}"
+    while True:
+        rows = await _fetch(query, params)
+        ids = [row["id"] for row in rows]
+        if not ids:
+            return removed
+        batch_removed = await _expire_ids(ids, row_condition, row_params)
+        removed += batch_removed
+        if len(ids) < CACHE_EXPIRE_BATCH_SIZE or not batch_removed:
+            return removed
+
+
+async def _drop_empty_langset(trans_lang: str):
+    """语言组合下已没有缓存且仍然闲置时，删除它在 translation_langsets 中的记录"""
+    query = (
+        f"DELETE FROM translation_langsets WHERE trans_lang = {_placeholder()} "
+        f"AND last_hit_time < {_days_ago_sql()} AND NOT EXISTS ("
+        f"SELECT 1 FROM translations_new WHERE trans_lang = {_placeholder()})"
+    )
+    params = [trans_lang, CACHE_LANGSET_IDLE_DAYS, trans_lang]
+    if DB_TYPE == "mysql":
+        async with get_db('write') as (conn, cursor):
+            await cursor.execute(query, params)
+            await conn.commit()
+    else:
+        await asyncio.to_thread(_sqlite_execute, query, params)
+
+
+async def expire_cold_translations() -> Dict[str, int]:
+    """按策略清理冷数据：长期未命中的翻译 + 无人再请求的目标语言组合"""
+    result = {"expired": 0, "langset_pruned": 0}
+    if CACHE_LANGSET_IDLE_DAYS > 0:
+        # translation_langsets 在保存和刷命中计数时更新，按 last_hit_time 索引找出闲置的语言组合
+        idle_langset = f"last_hit_time < {_days_ago_sql()}"
+        rows = await _fetch(
+            f"SELECT trans_lang FROM translation_langsets WHERE {idle_langset}",
+            [CACHE_LANGSET_IDLE_DAYS],
+        )
+        idle_row = f"{LAST_ACCESS_SQL} < {_days_ago_sql()}"
+        for row in rows:
+            # 每批都重新确认整个语言组合仍然闲置
+            langset_idle = (
+                f"trans_lang = {_placeholder()} AND {idle_row} AND EXISTS ("
+                f"SELECT 1 FROM translation_langsets WHERE trans_lang = {_placeholder()} AND {idle_langset})"
+            )
+            result["langset_pruned"] += await _expire_where(
+                langset_idle,
+                [row["trans_lang"], CACHE_LANGSET_IDLE_DAYS, row["trans_lang"], CACHE_LANGSET_IDLE_DAYS],
+                idle_row,
+                [CACHE_LANGSET_IDLE_DAYS],
+            )
+            await _drop_empty_langset(row["trans_lang"])
+    if CACHE_TTL_DAYS > 0:
+        expired_row = f"{LAST_ACCESS_SQL} < {_days_ago_sql()}"
+        result["expired"] = await _expire_where(
+            expired_row, [CACHE_TTL_DAYS], expired_row, [CACHE_TTL_DAYS]
+        )
+    return result
+
+
+def _sqlite_compact():
+    with get_db_sync('write') as conn:
+        # incremental_vacuum 每步只释放一页，executescript 会把语句执行完
+        conn.executescript(f"PRAGMA incremental_vacuum({CACHE_VACUUM_PAGES}); PRAGMA optimize;")
+
+
+async def compact_database(removed: int) -> bool:
+    """在线回收空间：SQLite 增量 vacuum，MySQL 清理量足够大时 OPTIMIZE TABLE（InnoDB 在线重建）
+
+    返回是否执行了 OPTIMIZE TABLE
+    """
+    if DB_TYPE == "mysql":
+        # 上次 OPTIMIZE 之后累计清理的行数从 cache_size_stats 统计，不依赖某个 worker 的内存
+        rows = await _fetch("""
+            SELECT COALESCE(SUM(expired + langset_pruned), 0) AS removed FROM cache_size_stats
+            WHERE id > (SELECT COALESCE(MAX(id), 0) FROM cache_size_stats WHERE optimized = 1)
+        """, [])
+        if rows[0]["removed"] + removed < CACHE_OPTIMIZE_MIN_ROWS:
+            return False
+        async with get_db('write') as (conn, cursor):
+            await cursor.execute("OPTIMIZE TABLE translations_new")
+            await cursor.fetchall()
+        return True
+    await asyncio.to_thread(_sqlite_compact)
+    return False
+
+
+def _sqlite_table_sizes(stats: Dict) -> Dict:
+    with get_db_sync('read') as conn:
+        cursor = conn.cursor()
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        stats["file_size"] = page_size * page_count
+        stats["free_size"] = page_size * freelist_count
+        for table in ("translations_new", "translations_archive"):
+            stats["tables"][table] = {
+                "rows": cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+            }
+        try:
+            # dbstat 需要 SQLITE_ENABLE_DBSTAT_VTAB，不可用时只统计文件大小
+            rows = cursor.execute("SELECT name, SUM(pgsize) AS size FROM dbstat GROUP BY name").fetchall()
+        except Exception:
+            rows = []
+        indexes = {
+            row["name"]: row["tbl_name"]
+            for row in cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")
+        }
+    for row in rows:
+        if row["name"] in stats["tables"]:
+            stats["tables"][row["name"]]["data_size"] = row["size"]
+        elif indexes.get(row["name"]) in stats["tables"]:
+            table = stats["tables"][indexes[row["name"]]]
+            table["index_size"] = table.get("index_size", 0) + row["size"]
+    return stats
+
+
+async def collect_table_sizes() -> Dict:
+    """统计表和索引占用空间（字节）"""
+    stats = {"tables": {}}
+    if DB_TYPE == "mysql":
+        rows = await _fetch("""
+            SELECT TABLE_NAME AS name, TABLE_ROWS AS table_rows, DATA_LENGTH AS data_size,
+                   INDEX_LENGTH AS index_size, DATA_FREE AS free_size
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('translations_new', 'translations_archive')
+        """, [])
+        for row in rows:
+            stats["tables"][row["name"]] = {
+                "rows": row["table_rows"],
+                "data_size": row["data_size"],
+                "index_size": row["index_size"],
+                "free_size": row["free_size"],
+            }
+        return stats
+
+    return await asyncio.to_thread(_sqlite_table_sizes, stats)
+
+
+def _sqlite_record_stats(insert_query: str, params: List):
+    with get_db_sync('write') as conn:
+        stats_id = conn.execute(insert_query, params).lastrowid
+        conn.execute("DELETE FROM cache_size_stats WHERE id <= ?", (stats_id - CACHE_STATS_HISTORY,))
+        conn.commit()
+
+
+async def record_size_stats(stats: Dict, result: Dict[str, int], optimized: bool):
+    """写入一条表/索引大小记录，只保留最近 CACHE_STATS_HISTORY 条"""
+    params = [result["expired"], result["langset_pruned"], int(optimized), json.dumps(stats)]
+    query = f"""
+        INSERT INTO cache_size_stats (expired, langset_pruned, optimized, stats_json)
+        VALUES ({", ".join([_placeholder()] * len(params))})
+    """
+    if DB_TYPE == "mysql":
+        async with get_db('write') as (conn, cursor):
+            await cursor.execute(query, params)
+            stats_id = cursor.lastrowid
+            await cursor.execute("DELETE FROM cache_size_stats WHERE id <= %s", (stats_id - CACHE_STATS_HISTORY,))
+            await conn.commit()
+    else:
+        await asyncio.to_thread(_sqlite_record_stats, query, params)
+
+
+async def get_size_history() -> List[Dict]:
+    """按时间顺序返回表和索引大小的历史记录"""
+    rows = await _fetch(
+        f"SELECT expired, langset_pruned, optimized, stats_json, create_time FROM cache_size_stats "
+        f"ORDER BY id DESC LIMIT {CACHE_STATS_HISTORY}",
+        [],
+    )
+    return [
+        {
+            "time": row["create_time"],
+            "expired": row["expired"],
+            "langset_pruned": row["langset_pruned"],
+            "optimized": bool(row["optimized"]),
+            **json.loads(row["stats_json"]),
+        }
+        for row in reversed(rows)
+    ]
+
+
+async def run_maintenance():
+    """执行一轮缓存维护：刷命中计数、过期清理、压缩、记录表大小"""
+    await flush_cache_hits()
+    result = await expire_cold_translations()
+    optimized = await compact_database(result["expired"] + result["langset_pruned"])
+    stats = await collect_table_sizes()
+    await record_size_stats(stats, result, optimized)
+    print("缓存维护完成:", {**result, "optimized": optimized, **stats})
+
+
+async def _maintenance_due() -> bool:
+    """距离上一轮维护（任意 worker 执行）是否已超过 CACHE_MAINTENANCE_INTERVAL"""
+    rows = await _fetch(
+        f"SELECT id FROM cache_size_stats WHERE create_time >= {_seconds_ago_sql()} LIMIT 1",
+        [CACHE_MAINTENANCE_INTERVAL],
+    )
+    return not rows
+
+
+async def maintenance_loop():
+    """后台任务：每个 worker 定期刷自己的命中计数；维护由拿到锁的一个 worker 按间隔执行"""
+    while True:
+        try:
+            await flush_cache_hits()
+            async with db_lock("maintenance") as acquired:
+                if acquired and await _maintenance_due():
+                    await run_maintenance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("缓存维护失败:", e)
+        await asyncio.sleep(CACHE_HIT_FLUSH_INTERVAL)